@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from io import BytesIO
 from typing import TYPE_CHECKING
 
 from packaging.version import parse
@@ -32,7 +31,7 @@ def check_minimal_arrow_version() -> None:
     Raises a RuntimeError in case pyarrow is not installed or installed version
     is not recent enough.
     """
-    # First version to introduce Table.sort_by
+    # Oldest version tested in CI
     minversion = "7.0.0"
     try:
         import pyarrow as pa
@@ -49,7 +48,9 @@ def convert_partition(data: bytes, meta: pd.DataFrame) -> pd.DataFrame:
     import pandas as pd
     import pyarrow as pa
 
-    file = BytesIO(data)
+    # Reading from an Arrow buffer instead of a Python file object lets the
+    # tables reference ``data`` instead of copying it
+    file = pa.BufferReader(pa.py_buffer(data))
     end = len(data)
     shards = []
     while file.tell() < end:
@@ -71,8 +72,11 @@ def convert_partition(data: bytes, meta: pd.DataFrame) -> pd.DataFrame:
     return df.astype(meta.dtypes, copy=False)
 
 
-def list_of_buffers_to_table(data: list[bytes]) -> pa.Table:
-    """Convert a list of arrow buffers and a schema to an Arrow Table"""
+def list_of_buffers_to_table(data: list[bytes | memoryview]) -> pa.Table:
+    """Convert a list of arrow buffers and a schema to an Arrow Table
+
+    The table references the memory of ``data`` without copying it.
+    """
     import pyarrow as pa
 
     return pa.concat_tables(deserialize_table(buffer) for buffer in data)
@@ -87,7 +91,26 @@ def serialize_table(table: pa.Table) -> bytes:
     return stream.getvalue().to_pybytes()
 
 
-def deserialize_table(buffer: bytes) -> pa.Table:
+def serialize_tables(tables: list[pa.Table]) -> list[memoryview]:
+    """Serialize many tables into a single buffer
+
+    Every table is written as its own IPC stream, so each returned view can be
+    read on its own with :func:`deserialize_table`. Sharing one output stream
+    avoids allocating and copying a separate buffer per table.
+    """
+    import pyarrow as pa
+
+    stream = pa.BufferOutputStream()
+    offsets = [0]
+    for table in tables:
+        with pa.ipc.new_stream(stream, table.schema) as writer:
+            writer.write_table(table)
+        offsets.append(stream.tell())
+    buffer = memoryview(stream.getvalue())
+    return [buffer[start:stop] for start, stop in zip(offsets, offsets[1:])]
+
+
+def deserialize_table(buffer: bytes | memoryview) -> pa.Table:
     import pyarrow as pa
 
     with pa.ipc.open_stream(pa.py_buffer(buffer)) as reader:
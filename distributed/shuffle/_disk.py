@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import contextlib
+import os
 import pathlib
 import shutil
 
@@ -8,6 +9,29 @@ from distributed.shuffle._buffer import ShardsBuffer
 from distributed.shuffle._limiter import ResourceLimiter
 from distributed.utils import log_errors
 
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, OSError, ValueError):
+    _IOV_MAX = 1024
+if _IOV_MAX <= 0:
+    _IOV_MAX = 1024
+
+
+def _writev(fd: int, frames: list[memoryview]) -> None:
+    """Write all frames to a file descriptor with as few syscalls as possible"""
+    i = 0
+    while i < len(frames):
+        batch = frames[i : i + _IOV_MAX]
+        written = os.writev(fd, batch)
+        # Skip the frames that were written entirely and continue with the rest
+        # of a partially written one
+        for frame in batch:
+            if written < frame.nbytes:
+                frames[i] = frame[written:]
+                break
+            written -= frame.nbytes
+            i += 1
+
 
 class DiskShardsBuffer(ShardsBuffer):
     """Accept, buffer, and write many small objects to many files
@@ -18,9 +42,10 @@ class DiskShardsBuffer(ShardsBuffer):
 
     **State**
 
-    -   shards: dict[str, list[bytes]]
+    -   shards: dict[str, list[bytes | list[bytes]]]
 
         This is our in-memory buffer of data waiting to be written to files.
+        A shard may also be a list of frames which are written back to back.
 
     -   sizes: dict[str, int]
 
@@ -51,7 +76,7 @@ class DiskShardsBuffer(ShardsBuffer):
         self.directory = pathlib.Path(directory)
         self.directory.mkdir(exist_ok=True)
 
-    async def _process(self, id: str, shards: list[bytes]) -> None:
+    async def _process(self, id: str, shards: list[bytes | list[bytes]]) -> None:
         """Write one buffer to file
 
         This function was built to offload the disk IO, but since then we've
@@ -68,25 +93,46 @@ class DiskShardsBuffer(ShardsBuffer):
         with log_errors():
             # Consider boosting total_size a bit here to account for duplication
             with self.time("write"):
-                with open(
-                    self.directory / str(id), mode="ab", buffering=100_000_000
-                ) as f:
+                path = self.directory / str(id)
+                if hasattr(os, "writev"):
+                    # Hand all frames of the batch to the kernel at once instead
+                    # of copying them through a userspace buffer
+                    frames: list[memoryview] = []
                     for shard in shards:
-                        f.write(shard)
-
-    def read(self, id: int | str) -> bytes:
-        """Read a complete file back into memory"""
+                        for frame in shard if isinstance(shard, list) else (shard,):
+                            view = memoryview(frame).cast("B")
+                            if view.nbytes:
+                                frames.append(view)
+                    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+                    try:
+                        _writev(fd, frames)
+                    finally:
+                        os.close(fd)
+                else:
+                    with open(path, mode="ab", buffering=100_000_000) as f:
+                        for shard in shards:
+                            if isinstance(shard, list):
+                                f.writelines(shard)
+                            else:
+                                f.write(shard)
+
+    def read(self, id: int | str) -> bytearray:
+        """Read a complete file back into memory
+
+        The data is read into a writable buffer, so that objects deserialized
+        from it zero-copy are writable as well.
+        """
         self.raise_on_exception()
         if not self._inputs_done:
             raise RuntimeError("Tried to read from file before done.")
 
         try:
             with self.time("read"):
-                with open(
-                    self.directory / str(id), mode="rb", buffering=100_000_000
-                ) as f:
-                    data = f.read()
-                    size = f.tell()
+                # readinto reads directly into the preallocated buffer, so
+                # there is no need for a large read buffer
+                with open(self.directory / str(id), mode="rb") as f:
+                    data = bytearray(os.fstat(f.fileno()).st_size)
+                    size = f.readinto(data)
         except FileNotFoundError:
             raise KeyError(id)
 
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from collections import defaultdict
-from collections.abc import Iterable, Sequence
+from collections.abc import Collection, Iterable, Sequence
 from typing import TYPE_CHECKING, Any
 
 from dask.base import is_dask_collection, tokenize
@@ -134,7 +134,7 @@ def merge_transfer(
     id: ShuffleId,
     input_partition: int,
     npartitions: int,
-    parts_out: set[int],
+    parts_out: Collection[int],
 ):
     return shuffle_transfer(
         input=input,
@@ -96,20 +96,30 @@ the same output brick.
 
 from __future__ import annotations
 
+import io
 import pickle
+import struct
+import sys
 from collections import defaultdict
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Iterator, Sequence
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from io import BytesIO
+from functools import lru_cache
+from itertools import accumulate, product
 from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple
 
 import dask
 from dask.base import tokenize
 from dask.highlevelgraph import HighLevelGraph, MaterializedLayer
+from dask.sizeof import sizeof
 
 from distributed.core import PooledRPCCall
 from distributed.exceptions import Reschedule
+from distributed.protocol.compression import (
+    compressions,
+    get_compression_settings,
+    maybe_compress,
+)
 from distributed.shuffle._core import (
     NDIndex,
     ShuffleId,
@@ -120,8 +130,7 @@ from distributed.shuffle._core import (
     get_worker_plugin,
 )
 from distributed.shuffle._limiter import ResourceLimiter
-from distributed.shuffle._shuffle import shuffle_barrier
-from distributed.sizeof import sizeof
+from distributed.shuffle._shuffle import _SHARD_TUPLE_SIZE, shuffle_barrier
 
 if TYPE_CHECKING:
     import numpy as np
@@ -232,9 +241,13 @@ SplitAxis: TypeAlias = list[SplitChunk]
 SplitAxes: TypeAlias = list[SplitAxis]
 
 
+@lru_cache(maxsize=32)
 def split_axes(old: ChunkedAxes, new: ChunkedAxes) -> SplitAxes:
     """Calculate how to split the old chunks on each axis to create the new chunks
 
+    The result is cached per ``(old, new)`` and shared between all callers; it
+    must not be mutated.
+
     Parameters
     ----------
     old : ChunkedAxes
@@ -248,6 +261,8 @@ def split_axes(old: ChunkedAxes, new: ChunkedAxes) -> SplitAxes:
         Splits along each axis that determine how to slice the input chunks to create
         the new chunks by concatenating the resulting shards.
     """
+    import numpy as np
+
     from dask.array.rechunk import old_to_new
 
     _old_to_new = old_to_new(old, new)
@@ -261,35 +276,288 @@ def split_axes(old: ChunkedAxes, new: ChunkedAxes) -> SplitAxes:
                     Split(new_chunk_index, split_index, slice)
                 )
         for old_chunk in old_axis:
-            old_chunk.sort(key=lambda split: split.slice.start)
+            if len(old_chunk) < 2:
+                continue
+            starts = np.fromiter(
+                (split.slice.start for split in old_chunk),
+                dtype=np.int64,
+                count=len(old_chunk),
+            )
+            old_chunk[:] = [old_chunk[i] for i in np.argsort(starts, kind="stable")]
         axes.append(old_axis)
     return axes
 
 
-def convert_chunk(data: bytes) -> np.ndarray:
+#: Number of frames of a serialized shard, followed by the length of every frame
+_FRAME_COUNT = struct.Struct("<Q")
+
+
+#: Alignment in bytes of the shards copied by :func:`_make_contiguous`
+_SHARD_ALIGNMENT = 64
+
+
+def _make_contiguous(shards: list[np.ndarray]) -> list[np.ndarray]:
+    """Copy the non-contiguous shards into a single preallocated buffer
+
+    Only contiguous arrays are pickled out-of-band. Instead of allocating a new
+    array for every non-contiguous shard, they are all copied into views of one
+    buffer. Arrays of objects are always pickled in-band and left untouched, as
+    are subclasses like masked arrays and other array types, which could lose
+    their extra state in the copy.
+    """
     import numpy as np
 
-    from dask.array.core import concatenate3
+    def needs_copy(shard: np.ndarray) -> bool:
+        return type(shard) is np.ndarray and not (
+            shard.flags.forc or shard.dtype.hasobject
+        )
+
+    def aligned(nbytes: int) -> int:
+        return -(-nbytes // _SHARD_ALIGNMENT) * _SHARD_ALIGNMENT
+
+    total = sum(aligned(shard.nbytes) for shard in shards if needs_copy(shard))
+    if not total:
+        return shards
+
+    buffer = np.empty(total, dtype=np.uint8)
+    offset = 0
+    out = []
+    for shard in shards:
+        if needs_copy(shard):
+            copy: np.ndarray = np.ndarray(
+                shard.shape, dtype=shard.dtype, buffer=buffer, offset=offset
+            )
+            np.copyto(copy, shard)
+            offset += aligned(shard.nbytes)
+            shard = copy
+        out.append(shard)
+    return out
+
+
+@lru_cache
+def _frame_table(nframes: int) -> struct.Struct:
+    """Format of the frame lengths and compression IDs of a shard with
+    ``nframes`` frames, which follow the frame count in the first frame"""
+    return struct.Struct(f"<{nframes}Q{nframes}B")
+
+
+#: Compression algorithms by the ID stored in the frame table
+_COMPRESSIONS: tuple[str | None, ...] = (None, "zlib", "snappy", "lz4", "zstd")
+
+
+class _ShardPickler:
+    """Serialize shards into frames that can be written to disk as-is
+
+    Each shard is pickled with protocol 5. The first frame holds a table of
+    frame lengths and compression IDs followed by the pickled header, all other
+    frames are the out-of-band buffers of the array which are never copied into
+    the pickle stream. The buffers are compressed with ``compression`` if they
+    compress well, see :func:`~distributed.protocol.compression.maybe_compress`.
+
+    The first frame is padded to a multiple of ``_SHARD_ALIGNMENT`` bytes, so
+    that the first buffer of a shard stays aligned when the shard is read back
+    at an aligned offset.
+
+    A single pickler and stream are reused for all shards of a partition;
+    only the memo is cleared between shards so that every header can be
+    unpickled on its own.
+    """
+
+    def __init__(self, compression: str | None = None) -> None:
+        self._compression = compression
+        self._stream = io.BytesIO()
+        self._buffers: list[pickle.PickleBuffer] = []
+        self._pickler = pickle.Pickler(
+            self._stream, protocol=5, buffer_callback=self._buffers.append
+        )
+
+    def dump(self, shard_index: NDIndex, shard: np.ndarray) -> list[Any]:
+        stream = self._stream
+        stream.seek(0)
+        stream.truncate()
+        self._pickler.clear_memo()
+        self._pickler.dump((shard_index, shard))
+        header = stream.getbuffer()
+        buffers: list[Any] = self._buffers.copy()
+        self._buffers.clear()
+        codecs = [0] * (len(buffers) + 1)
+        if self._compression:
+            for i, buffer in enumerate(buffers):
+                name, compressed = maybe_compress(
+                    memoryview(buffer), compression=self._compression
+                )
+                # Uncompressed buffers stay PickleBuffers to be sent out-of-band
+                if name is not None:
+                    buffers[i] = compressed
+                    codecs[i + 1] = _COMPRESSIONS.index(name)
+        n = len(buffers) + 1
+        table_format = _frame_table(n)
+        # Pickle ignores the padding after the end of the header
+        padding = -(_FRAME_COUNT.size + table_format.size + header.nbytes)
+        padding %= _SHARD_ALIGNMENT
+        lengths = [header.nbytes + padding, *(memoryview(b).nbytes for b in buffers)]
+        table = _FRAME_COUNT.pack(n) + table_format.pack(*lengths, *codecs)
+        frame = b"".join([table, header, bytes(padding)])
+        header.release()
+        return [frame, *buffers]
+
+
+def _load_shards(data: bytes | bytearray) -> Iterator[tuple[NDIndex, np.ndarray]]:
+    """Iterate over the shards in ``data`` as written by :class:`_ShardPickler`
+
+    The arrays of uncompressed buffers are views into ``data`` and only writable
+    if ``data`` is.
+    """
+    view = memoryview(data)
+    offset = 0
+    end = len(view)
+    while offset < end:
+        (nframes,) = _FRAME_COUNT.unpack_from(view, offset)
+        offset += _FRAME_COUNT.size
+        table = _frame_table(nframes)
+        fields = table.unpack_from(view, offset)
+        offset += table.size
+        frames: list[bytes | bytearray | memoryview] = []
+        for length, codec in zip(fields[:nframes], fields[nframes:]):
+            frame = view[offset : offset + length]
+            if codec:
+                frames.append(compressions[_COMPRESSIONS[codec]].decompress(frame))
+            else:
+                frames.append(frame)
+            offset += length
+        yield pickle.loads(frames[0], buffers=frames[1:])
+
+
+class _ShardFrames:
+    """Serialized shards sent to one worker, grouped by output chunk
+
+    Every output chunk appears at most once, together with the total size of
+    its frames. See :class:`_ShardPickler` for the format of the frames. The
+    receiver concatenates the frames per output chunk without deserializing
+    them.
+    """
+
+    __slots__ = ("shards", "nbytes")
+
+    shards: list[tuple[NDIndex, list[Any], int]]
+    #: Total size of all frames
+    nbytes: int
+
+    def __init__(self, shards: list[tuple[NDIndex, list[Any], int]], nbytes: int):
+        self.shards = shards
+        self.nbytes = nbytes
+
+    @classmethod
+    def from_shards(cls, shards: list[tuple[NDIndex, list[Any]]]) -> _ShardFrames:
+        sized = [
+            (id, frames, sum(memoryview(frame).nbytes for frame in frames))
+            for id, frames in shards
+        ]
+        return cls(sized, sum(nbytes for _, _, nbytes in sized))
+
+    def __reduce__(
+        self,
+    ) -> tuple[type[_ShardFrames], tuple[list[tuple[NDIndex, list[Any], int]], int]]:
+        return _ShardFrames, (self.shards, self.nbytes)
+
+    def __sizeof__(self) -> int:
+        return self.nbytes
+
+
+class _Frames(list):
+    """Frames of one output chunk, written back to back by the disk buffer
+
+    Writing the frames as they were received avoids joining them into a
+    fresh ``bytes`` object for every output chunk.
+    """
+
+    __slots__ = ("nbytes",)
+
+    #: Total size of all frames
+    nbytes: int
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.nbytes = 0
+
+    def add(self, frames: list[Any], nbytes: int) -> None:
+        self.extend(frames)
+        self.nbytes += nbytes
+
+
+def _sizeof_frames(frames: _Frames) -> int:
+    return frames.nbytes
+
+
+# Registered without decorator syntax, which would leave the function untyped
+sizeof.register(_Frames)(_sizeof_frames)
+
+
+def convert_chunk(data: bytes | bytearray) -> np.ndarray:
+    import numpy as np
 
-    file = BytesIO(data)
     shards: dict[NDIndex, np.ndarray] = {}
+    subshape: list[int] | None = None
+
+    for index, shard in _load_shards(data):
+        shards[index] = shard
+        if subshape is None:
+            subshape = [i + 1 for i in index]
+        else:
+            subshape = [max(dim, i + 1) for dim, i in zip(subshape, index)]
+    assert subshape is not None
+
+    # Subclasses like masked arrays and other array types must be concatenated
+    # by concatenate3, which dispatches on their type
+    if all(type(shard) is np.ndarray for shard in shards.values()):
+        if len(shards) == 1:
+            (shard,) = shards.values()
+            # The shard is a zero-copy view into the data read from disk
+            if shard.flags.writeable and shard.flags.aligned:
+                return shard
+            return shard.copy()
+
+        axes = [axis for axis, n in enumerate(subshape) if n > 1]
+        if len(axes) == 1:
+            # All shards line up along a single axis
+            return np.concatenate(
+                [shard for _, shard in sorted(shards.items())], axis=axes[0]
+            )
 
-    while file.tell() < len(data):
-        for index, shard in pickle.load(file):
-            shards[index] = shard
+        return _concat_nd(shards, subshape)
 
-    subshape = [max(dim) + 1 for dim in zip(*shards.keys())]
-    assert len(shards) == np.prod(subshape)
+    from dask.array.core import concatenate3
 
     rec_cat_arg = np.empty(subshape, dtype="O")
     for index, shard in shards.items():
         rec_cat_arg[tuple(index)] = shard
     del data
-    del file
     arrs = rec_cat_arg.tolist()
     return concatenate3(arrs)
 
 
+def _concat_nd(shards: dict[NDIndex, np.ndarray], subshape: list[int]) -> np.ndarray:
+    """Assemble a chunk from a grid of NumPy shards
+
+    Like :func:`dask.array.core.concatenate3`, but the shards are copied into
+    the preallocated result straight from their grid positions, without going
+    through a nested list of arrays.
+    """
+    import numpy as np
+
+    sizes = [[0] * n for n in subshape]
+    for index, shard in shards.items():
+        for axis, i in enumerate(index):
+            sizes[axis][i] = shard.shape[axis]
+    offsets = [list(accumulate(axis, initial=0)) for axis in sizes]
+
+    first = shards[(0,) * len(subshape)]
+    result = np.empty(tuple(o[-1] for o in offsets), dtype=first.dtype)
+    for index, shard in shards.items():
+        result[tuple(slice(o[i], o[i + 1]) for o, i in zip(offsets, index))] = shard
+    return result
+
+
 class ArrayRechunkRun(ShuffleRun[NDIndex, "np.ndarray"]):
     """State for a single active rechunk execution
 
@@ -371,44 +639,59 @@ class ArrayRechunkRun(ShuffleRun[NDIndex, "np.ndarray"]):
         self.partitions_of = dict(partitions_of)
         self.worker_for = worker_for
         self.split_axes = split_axes(old, new)
+        self._compression = get_compression_settings("distributed.p2p.compression")
+
+        import numpy as np
+
+        # Array of indices into ``self._workers`` laid out like the output
+        # chunks, so that add_partition can look up the workers of all its
+        # shards at once instead of hashing every chunk index
+        self._workers = list(self.partitions_of)
+        ids = {addr: i for i, addr in enumerate(self._workers)}
+        self._worker_ids = np.empty(tuple(map(len, new)), dtype=np.int32)
+        for part, addr in worker_for.items():
+            self._worker_ids[part] = ids[addr]
 
-    async def _receive(self, data: list[tuple[NDIndex, bytes]]) -> None:
+    async def _receive(self, data: list[tuple[NDIndex, _ShardFrames]]) -> None:
         self.raise_if_closed()
 
         filtered = []
-        for d in data:
-            id, payload = d
+        for id, payload in data:
             if id in self.received:
                 continue
             filtered.append(payload)
             self.received.add(id)
-            self.total_recvd += sizeof(d)
+            # Same as sizeof(d) without the dispatch overhead
+            self.total_recvd += (
+                _SHARD_TUPLE_SIZE
+                + sys.getsizeof(id)
+                + sum(map(sys.getsizeof, id))
+                + sys.getsizeof(payload)
+            )
         del data
         if not filtered:
             return
         try:
-            shards = await self.offload(self._repartition_shards, filtered)
-            del filtered
-            await self._write_to_disk(shards)
+            # Repartitioning only regroups references to the received frames,
+            # which is cheaper than offloading it
+            await self._write_to_disk(self._repartition_shards(filtered))
         except Exception as e:
             self._exception = e
             raise
 
-    def _repartition_shards(self, data: list[bytes]) -> dict[NDIndex, bytes]:
-        repartitioned: defaultdict[
-            NDIndex, list[tuple[NDIndex, np.ndarray]]
-        ] = defaultdict(list)
+    def _repartition_shards(self, data: list[_ShardFrames]) -> dict[NDIndex, _Frames]:
+        repartitioned: defaultdict[NDIndex, _Frames] = defaultdict(_Frames)
         for buffer in data:
-            for id, shard in pickle.loads(buffer):
-                repartitioned[id].append(shard)
-        return {k: pickle.dumps(v) for k, v in repartitioned.items()}
+            for id, frames, nbytes in buffer.shards:
+                repartitioned[id].add(frames, nbytes)
+        return repartitioned
 
     async def add_partition(self, data: np.ndarray, partition_id: NDIndex) -> int:
         self.raise_if_closed()
         if self.transferred:
             raise RuntimeError(f"Cannot add more partitions to {self}")
 
-        def _() -> dict[str, tuple[NDIndex, bytes]]:
+        def _() -> dict[str, tuple[NDIndex, _ShardFrames]]:
             """Return a mapping of worker addresses to a tuple of input partition
             IDs and shard data.
 
@@ -419,22 +702,45 @@ class ArrayRechunkRun(ShuffleRun[NDIndex, "np.ndarray"]):
             needs the sub-index to know where each shard belongs within the chunk.
             Adding the sub-index into the serialized payload on the sender allows us to
             write the serialized payload directly to disk on the receiver.
+
+            Every shard is serialized on its own, see :class:`_ShardPickler`.
             """
-            out: dict[
-                str, list[tuple[NDIndex, tuple[NDIndex, np.ndarray]]]
+            import numpy as np
+
+            out: dict[str, list[tuple[NDIndex, list[Any]]]] = {}
+            splits = [axis[i] for axis, i in zip(self.split_axes, partition_id)]
+            chunk_axes = [[s.chunk_index for s in ss] for ss in splits]
+            # The Cartesian products of the per-axis fields enumerate the splits
+            # in the same order, so zipping them avoids unpacking every ndsplit.
+            # This builds the index tuples in C and is faster than nested loops
+            # specialized for the number of dimensions.
+            # np.ix_ selects the workers of the same grid, also in C order.
+            chunk_indices = product(*chunk_axes)
+            shard_indices = product(*([s.split_index for s in ss] for ss in splits))
+            ndslices = product(*([s.slice for s in ss] for ss in splits))
+            worker_ids = self._worker_ids[np.ix_(*chunk_axes)].ravel().tolist()
+
+            by_worker: defaultdict[
+                int, list[tuple[NDIndex, NDIndex, np.ndarray]]
             ] = defaultdict(list)
-            from itertools import product
-
-            ndsplits = product(
-                *(axis[i] for axis, i in zip(self.split_axes, partition_id))
-            )
-
-            for ndsplit in ndsplits:
-                chunk_index, shard_index, ndslice = zip(*ndsplit)
-                out[self.worker_for[chunk_index]].append(
-                    (chunk_index, (shard_index, data[ndslice]))
-                )
-            return {k: (partition_id, pickle.dumps(v)) for k, v in out.items()}
+            for worker_id, chunk_index, shard_index, ndslice in zip(
+                worker_ids, chunk_indices, shard_indices, ndslices
+            ):
+                by_worker[worker_id].append((chunk_index, shard_index, data[ndslice]))
+
+            pickler = _ShardPickler(self._compression)
+            for worker_id, shards in by_worker.items():
+                worker = self._workers[worker_id]
+                arrays = _make_contiguous([shard for _, _, shard in shards])
+                # Group the frames by output chunk so that the receiver can
+                # write them without looking into them
+                by_chunk: defaultdict[NDIndex, list[Any]] = defaultdict(list)
+                for (chunk_index, shard_index, _), array in zip(shards, arrays):
+                    by_chunk[chunk_index].extend(pickler.dump(shard_index, array))
+                out[worker] = list(by_chunk.items())
+            return {
+                k: (partition_id, _ShardFrames.from_shards(v)) for k, v in out.items()
+            }
 
         out = await self.offload(_)
         await self._write_to_comm(out)
@@ -451,10 +757,10 @@ class ArrayRechunkRun(ShuffleRun[NDIndex, "np.ndarray"]):
 
         await self.flush_receive()
 
-        data = self._read_from_disk(partition_id)
-
         def _() -> np.ndarray:
-            return convert_chunk(data)
+            # Read in the executor as well, so that the read does not block the
+            # event loop and overlaps with the conversion of other chunks
+            return convert_chunk(self._read_from_disk(partition_id))
 
         return await self.offload(_)
 
@@ -484,6 +790,12 @@ class ArrayRechunkState(ShuffleState):
 def get_worker_for_hash_sharding(
     output_partition: NDIndex, workers: Sequence[str]
 ) -> str:
-    """Get address of target worker for this output partition using hash sharding"""
+    """Get address of target worker for this output partition using hash sharding
+
+    Hashing a tuple of integers is implemented in C with an xxHash-based
+    mixing of the element hashes and, unlike hashing strings or bytes, does
+    not depend on ``PYTHONHASHSEED``. The assignment is therefore stable across
+    processes.
+    """
     i = hash(output_partition) % len(workers)
     return workers[i]
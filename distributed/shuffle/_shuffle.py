@@ -1,26 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
 import logging
+import pickle
+import sys
+import threading
 from collections import defaultdict
-from collections.abc import Callable, Iterable, Iterator, Sequence
+from collections.abc import Callable, Collection, Iterable, Iterator, Sequence
 from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any, ClassVar, Union
-
-import toolz
+from typing import TYPE_CHECKING, Any, ClassVar, TypeVar, Union
 
+import dask
 from dask.base import tokenize
 from dask.highlevelgraph import HighLevelGraph
 from dask.layers import Layer
+from dask.utils import parse_bytes
 
 from distributed.core import PooledRPCCall
 from distributed.exceptions import Reschedule
+from distributed.protocol import to_serialize
 from distributed.shuffle._arrow import (
     check_dtype_support,
     check_minimal_arrow_version,
     convert_partition,
     list_of_buffers_to_table,
-    serialize_table,
+    serialize_tables,
 )
 from distributed.shuffle._core import (
     NDIndex,
@@ -33,10 +39,16 @@ from distributed.shuffle._core import (
 )
 from distributed.shuffle._exceptions import ShuffleClosedError
 from distributed.shuffle._limiter import ResourceLimiter
-from distributed.sizeof import sizeof
 
 logger = logging.getLogger("distributed.shuffle")
+
+# Size of an empty ``(partition_id, buffer)`` tuple as reported by ``sizeof``
+_SHARD_TUPLE_SIZE = sys.getsizeof((None, None))
+
+_T = TypeVar("_T")
+
 if TYPE_CHECKING:
+    import numpy as np
     import pandas as pd
     import pyarrow as pa
 
@@ -52,7 +64,7 @@ def shuffle_transfer(
     input_partition: int,
     npartitions: int,
     column: str,
-    parts_out: set[int],
+    parts_out: Collection[int],
 ) -> int:
     try:
         return get_worker_plugin().add_partition(
@@ -142,6 +154,7 @@ class P2PShuffleLayer(Layer):
         meta_input: pd.DataFrame,
         parts_out: Iterable | None = None,
         annotations: dict | None = None,
+        input_keys: frozenset[_T_Key] | None = None,
     ):
         check_minimal_arrow_version()
         self.name = name
@@ -150,10 +163,11 @@ class P2PShuffleLayer(Layer):
         self.name_input = name_input
         self.meta_input = meta_input
         if parts_out:
-            self.parts_out = set(parts_out)
+            self.parts_out = frozenset(parts_out)
         else:
-            self.parts_out = set(range(self.npartitions))
+            self.parts_out = frozenset(range(self.npartitions))
         self.npartitions_input = npartitions_input
+        self._input_keys = input_keys
         annotations = annotations or {}
         annotations.update({"shuffle": lambda key: key[1]})
         super().__init__(annotations=annotations)
@@ -190,6 +204,15 @@ class P2PShuffleLayer(Layer):
     def __len__(self) -> int:
         return len(self._dict)
 
+    @property
+    def input_keys(self) -> frozenset[_T_Key]:
+        """Keys of all input partitions, shared with culled copies of this layer"""
+        if self._input_keys is None:
+            self._input_keys = frozenset(
+                (self.name_input, i) for i in range(self.npartitions_input)
+            )
+        return self._input_keys
+
     def _cull(self, parts_out: Iterable[int]) -> P2PShuffleLayer:
         return P2PShuffleLayer(
             self.name,
@@ -199,6 +222,7 @@ class P2PShuffleLayer(Layer):
             self.name_input,
             self.meta_input,
             parts_out=parts_out,
+            input_keys=self.input_keys,
         )
 
     def _keys_to_parts(self, keys: Iterable[_T_Key]) -> set[int]:
@@ -221,93 +245,128 @@ class P2PShuffleLayer(Layer):
         tasks to produce the keys (indices) included in `parts_out`.
         Therefore, "culling" the layer only requires us to reset this
         parameter.
+
+        Every output partition depends on all input partitions, so they
+        all share the same immutable set of input keys.
         """
         parts_out = self._keys_to_parts(keys)
-        input_parts = {(self.name_input, i) for i in range(self.npartitions_input)}
-        culled_deps = {(self.name, part): input_parts.copy() for part in parts_out}
+        input_keys = self.input_keys
+        culled_deps = {(self.name, part): input_keys for part in parts_out}
 
-        if parts_out != set(self.parts_out):
+        if parts_out != self.parts_out:
             culled_layer = self._cull(parts_out)
             return culled_layer, culled_deps
         else:
             return self, culled_deps
 
     def _construct_graph(self) -> _T_LowLevelGraph:
-        token = tokenize(self.name_input, self.column, self.npartitions, self.parts_out)
-        dsk: _T_LowLevelGraph = {}
+        # Canonicalize once; the sorted tuple is both tokenized and embedded in
+        # every transfer task
+        parts_out = tuple(sorted(self.parts_out))
+        token = tokenize(self.name_input, self.column, self.npartitions, parts_out)
         _barrier_key = barrier_key(ShuffleId(token))
-        name = "shuffle-transfer-" + token
-        transfer_keys = list()
-        for i in range(self.npartitions_input):
-            transfer_keys.append((name, i))
-            dsk[(name, i)] = (
+        name_input = self.name_input
+        npartitions = self.npartitions
+        column = self.column
+        transfer_name = "shuffle-transfer-" + token
+        dsk: _T_LowLevelGraph = {
+            (transfer_name, i): (
                 shuffle_transfer,
-                (self.name_input, i),
+                (name_input, i),
                 token,
                 i,
-                self.npartitions,
-                self.column,
-                self.parts_out,
+                npartitions,
+                column,
+                parts_out,
             )
-
-        dsk[_barrier_key] = (shuffle_barrier, token, transfer_keys)
+            for i in range(self.npartitions_input)
+        }
+        dsk[_barrier_key] = (shuffle_barrier, token, list(dsk))
 
         name = self.name
-        for part_out in self.parts_out:
-            dsk[(name, part_out)] = (
-                shuffle_unpack,
-                token,
-                part_out,
-                _barrier_key,
-                self.meta_input,
-            )
+        meta_input = self.meta_input
+        dsk.update(
+            {
+                (name, part_out): (
+                    shuffle_unpack,
+                    token,
+                    part_out,
+                    _barrier_key,
+                    meta_input,
+                )
+                for part_out in parts_out
+            }
+        )
         return dsk
 
 
+def encode_worker_for(worker_for: pd.Series) -> tuple[np.ndarray, list[str]]:
+    """Encode a categorical mapping of output partitions to workers
+
+    Returns an array holding the index into the returned workers for every
+    output partition, or -1 for output partitions without a worker.
+    """
+    import numpy as np
+
+    codes = np.full(
+        int(worker_for.index.max()) + 1 if len(worker_for) else 0, -1, dtype=np.int32
+    )
+    codes[worker_for.index.to_numpy()] = worker_for.cat.codes.to_numpy()
+    return codes, list(worker_for.cat.categories)
+
+
 def split_by_worker(
     df: pd.DataFrame,
     column: str,
-    worker_for: pd.Series,
+    worker_codes: np.ndarray,
+    workers: Sequence[str],
 ) -> dict[Any, pa.Table]:
     """
     Split data into many arrow batches, partitioned by destination worker
+
+    ``worker_codes`` and ``workers`` encode the destination of every output
+    partition as returned by :func:`encode_worker_for`.
     """
     import numpy as np
     import pyarrow as pa
 
-    df = df.merge(
-        right=worker_for.cat.codes.rename("_worker"),
-        left_on=column,
-        right_index=True,
-        how="inner",
-    )
+    partitions = df[column].to_numpy()
+    if not len(partitions):
+        return {}
+    # Look up the worker of every row in a dense array instead of merging with
+    # a mapping; rows of partitions that aren't wanted get -1.
+    if int(partitions.max()) < len(worker_codes):
+        codes = worker_codes[partitions]
+    else:
+        codes = np.full(len(partitions), -1, dtype=worker_codes.dtype)
+        in_range = partitions < len(worker_codes)
+        codes[in_range] = worker_codes[partitions[in_range]]
+    wanted = codes >= 0
+    if not wanted.all():
+        df = df[wanted]
+        codes = codes[wanted]
     nrows = len(df)
     if not nrows:
         return {}
-    # assert len(df) == nrows  # Not true if some outputs aren't wanted
     # FIXME: If we do not preserve the index something is corrupting the
     # bytestream such that it cannot be deserialized anymore
     t = pa.Table.from_pandas(df, preserve_index=True)
-    t = t.sort_by("_worker")
-    codes = np.asarray(t["_worker"])
-    t = t.drop(["_worker"])
     del df
-
-    splits = np.where(codes[1:] != codes[:-1])[0] + 1
-    splits = np.concatenate([[0], splits])
-
+    order = np.argsort(codes, kind="stable")
+    t = t.take(pa.array(order))
+    del order
+
+    # Worker codes are small non-negative integers, so counting them yields the
+    # shard boundaries in one pass without comparing neighboring rows
+    counts = np.bincount(codes)
+    unique_codes = np.flatnonzero(counts)
+    lengths = counts[unique_codes]
+    offsets = np.cumsum(lengths) - lengths
     shards = [
-        t.slice(offset=a, length=b - a) for a, b in toolz.sliding_window(2, splits)
+        t.slice(offset=a, length=n) for a, n in zip(offsets.tolist(), lengths.tolist())
     ]
-    shards.append(t.slice(offset=splits[-1], length=None))
-
-    unique_codes = codes[splits]
-    out = {
-        # FIXME https://github.com/pandas-dev/pandas-stubs/issues/43
-        worker_for.cat.categories[code]: shard
-        for code, shard in zip(unique_codes, shards)
-    }
-    assert sum(map(len, out.values())) == nrows
+
+    out = {workers[code]: shard for code, shard in zip(unique_codes.tolist(), shards)}
     return out
 
 
@@ -316,20 +375,24 @@ def split_by_partition(t: pa.Table, column: str) -> dict[Any, pa.Table]:
     Split data into many arrow batches, partitioned by final partition
     """
     import numpy as np
+    import pyarrow as pa
 
-    partitions = t.select([column]).to_pandas()[column].unique()
-    partitions.sort()
-    t = t.sort_by(column)
+    partition = t.column(column).to_numpy()
+    order = np.argsort(partition, kind="stable")
+    # ``take`` combines the chunks of the concatenated input, so the shards
+    # below are zero-copy slices of contiguous buffers
+    t = t.take(pa.array(order))
+    partition = partition[order]
 
-    partition = np.asarray(t[column])
-    splits = np.where(partition[1:] != partition[:-1])[0] + 1
-    splits = np.concatenate([[0], splits])
+    offsets = np.concatenate([[0], np.flatnonzero(partition[1:] != partition[:-1]) + 1])
+    lengths = np.diff(offsets, append=len(partition))
+    partitions = partition[offsets]
 
+    # The shards cover every row exactly once since the lengths are taken from
+    # the split points of the sorted column
     shards = [
-        t.slice(offset=a, length=b - a) for a, b in toolz.sliding_window(2, splits)
+        t.slice(offset=a, length=n) for a, n in zip(offsets.tolist(), lengths.tolist())
     ]
-    shards.append(t.slice(offset=splits[-1], length=None))
-    assert len(t) == sum(map(len, shards))
     assert len(partitions) == len(shards)
     return dict(zip(partitions, shards))
 
@@ -364,6 +427,8 @@ class DataFrameShuffleRun(ShuffleRun[int, "pd.DataFrame"]):
         The scratch directory to buffer data in.
     executor:
         Thread pool to use for offloading compute.
+    nthreads:
+        Number of threads of ``executor``.
     loop:
         The event loop.
     rpc:
@@ -387,6 +452,7 @@ class DataFrameShuffleRun(ShuffleRun[int, "pd.DataFrame"]):
         local_address: str,
         directory: str,
         executor: ThreadPoolExecutor,
+        nthreads: int,
         rpc: Callable[[str], PooledRPCCall],
         scheduler: PooledRPCCall,
         memory_limiter_disk: ResourceLimiter,
@@ -407,55 +473,198 @@ class DataFrameShuffleRun(ShuffleRun[int, "pd.DataFrame"]):
             memory_limiter_disk=memory_limiter_disk,
         )
         self.column = column
+        self.nthreads = nthreads
         partitions_of = defaultdict(list)
         for part, addr in worker_for.items():
             partitions_of[addr].append(part)
         self.partitions_of = dict(partitions_of)
         self.worker_for = pd.Series(worker_for, name="_workers").astype("category")
+        # The worker of every output partition as an index into ``_workers``
+        self._worker_codes, self._workers = encode_worker_for(self.worker_for)
+        self.batch_size = parse_bytes(dask.config.get("distributed.p2p.batch-size"))
+        self.max_buffered_batches = dask.config.get(
+            "distributed.p2p.max-buffered-batches"
+        )
+        # Shards smaller than ``batch_size`` that are held back to be merged with
+        # later shards of the same output partition
+        self._held: defaultdict[int, list[pa.Table]] = defaultdict(list)
+        self._held_nbytes: defaultdict[int, int] = defaultdict(int)
+        # Upper bound of the memory kept alive by the held shards, which are
+        # slices of larger tables, and the number of those tables
+        self._held_memory = 0
+        self._held_batches = 0
+        self._held_lock = threading.Lock()
+        self._flush_held_lock = asyncio.Lock()
+
+    async def send(
+        self, address: str, shards: list[tuple[int, bytes | memoryview]]
+    ) -> None:
+        """Send shards to a worker as a single contiguous buffer
+
+        The buffer is sent out-of-band together with the partition ids and
+        sizes of the shards, see :meth:`receive`.
+        """
+        self.raise_if_closed()
+        ids = [id for id, _ in shards]
+        sizes = [len(shard) for _, shard in shards]
+        buffer = pickle.PickleBuffer(b"".join([shard for _, shard in shards]))
+        del shards
+        return await self.rpc(address).shuffle_receive(
+            data=to_serialize((ids, sizes, buffer)),
+            shuffle_id=self.id,
+            run_id=self.run_id,
+        )
 
-    async def receive(self, data: list[tuple[int, bytes]]) -> None:
-        await self._receive(data)
+    async def receive(self, data: tuple[list[int], list[int], Any]) -> None:
+        ids, sizes, buffer = data
+        view = memoryview(buffer).cast("B")
+        offsets = [0, *itertools.accumulate(sizes)]
+        await self._receive(
+            [(id, view[a:b]) for id, a, b in zip(ids, offsets, offsets[1:])]
+        )
 
-    async def _receive(self, data: list[tuple[int, bytes]]) -> None:
+    async def _receive(self, data: list[tuple[int, bytes | memoryview]]) -> None:
         self.raise_if_closed()
 
+        new = {d[0] for d in data}
+        new -= self.received
+        if not new:
+            return
+        self.received |= new
         filtered = []
-        for d in data:
-            if d[0] not in self.received:
-                filtered.append(d[1])
-                self.received.add(d[0])
-                self.total_recvd += sizeof(d)
+        for id, buffer in data:
+            # Removing the id also drops duplicates within the same batch
+            if id in new:
+                new.remove(id)
+                filtered.append(buffer)
+                # Same as sizeof(d) without the dispatch overhead
+                self.total_recvd += _SHARD_TUPLE_SIZE + sys.getsizeof(id) + len(buffer)
         del data
-        if not filtered:
-            return
         try:
-            groups = await self.offload(self._repartition_buffers, filtered)
+            # Split the buffers across the executor so that several threads
+            # repartition and serialize them at once. Every part is handed to
+            # the disk buffer as soon as it is ready, so that its background
+            # tasks write to disk while the other parts are still processed.
+            nparts = min(len(filtered), self.nthreads)
+            parts = [filtered[i::nparts] for i in range(nparts)]
             del filtered
-            await self._write_to_disk(groups)
+            await self._offload_to_disk(self._repartition_buffers, parts)
+            del parts
         except Exception as e:
             self._exception = e
             raise
 
-    def _repartition_buffers(self, data: list[bytes]) -> dict[NDIndex, bytes]:
+    async def _offload_to_disk(
+        self,
+        func: Callable[[_T], dict[NDIndex, memoryview]],
+        parts: list[_T],
+    ) -> None:
+        """Offload ``func`` for every part and write the results to disk in the
+        order in which they complete
+
+        If any part fails, the remaining parts are cancelled and awaited
+        before the exception is raised.
+        """
+        tasks = [asyncio.ensure_future(self.offload(func, part)) for part in parts]
+        try:
+            for result in asyncio.as_completed(tasks):
+                await self._write_to_disk(await result)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _repartition_buffers(
+        self, data: list[bytes | memoryview]
+    ) -> dict[NDIndex, memoryview]:
         table = list_of_buffers_to_table(data)
         groups = split_by_partition(table, self.column)
-        assert len(table) == sum(map(len, groups.values()))
         del data
-        return {(k,): serialize_table(v) for k, v in groups.items()}
+        return self._serialize_groups(self._coalesce(groups, table.nbytes))
+
+    def _coalesce(
+        self, groups: dict[int, pa.Table], nbytes: int
+    ) -> dict[int, list[pa.Table]]:
+        """Hold back shards of output partitions smaller than ``batch_size``
+
+        Return the shards of all output partitions that reached ``batch_size``
+        together with their held back shards. ``nbytes`` is the size of the table
+        the shards were sliced from, which stays alive while any of them is held.
+        Once that memory exceeds 64 times ``batch_size``, or more than
+        ``max_buffered_batches`` tables are kept alive, all shards are released.
+        """
+        ready = {}
+        with self._held_lock:
+            for partition, shard in groups.items():
+                held = self._held[partition]
+                held.append(shard)
+                self._held_nbytes[partition] += shard.nbytes
+                if self._held_nbytes[partition] >= self.batch_size:
+                    ready[partition] = held
+                    del self._held[partition], self._held_nbytes[partition]
+            if len(ready) < len(groups):
+                self._held_memory += nbytes
+                self._held_batches += 1
+            if (
+                self._held_memory >= 64 * self.batch_size
+                or 0 < self.max_buffered_batches < self._held_batches
+            ):
+                ready.update(self._release_held())
+        return ready
+
+    def _release_held(self) -> dict[int, list[pa.Table]]:
+        held = dict(self._held)
+        self._held.clear()
+        self._held_nbytes.clear()
+        self._held_memory = 0
+        self._held_batches = 0
+        return held
+
+    def _serialize_groups(
+        self, groups: dict[int, list[pa.Table]]
+    ) -> dict[NDIndex, memoryview]:
+        import pyarrow as pa
+
+        tables = [
+            shards[0] if len(shards) == 1 else pa.concat_tables(shards, promote=True)
+            for shards in groups.values()
+        ]
+        return {(k,): buffer for k, buffer in zip(groups, serialize_tables(tables))}
+
+    async def flush_receive(self) -> None:
+        self.raise_if_closed()
+        async with self._flush_held_lock:
+            with self._held_lock:
+                held = self._release_held()
+            if held:
+                try:
+                    nparts = min(len(held), self.nthreads)
+                    items = list(held.items())
+                    del held
+                    await self._offload_to_disk(
+                        self._serialize_groups,
+                        [dict(items[i::nparts]) for i in range(nparts)],
+                    )
+                    del items
+                except Exception as e:
+                    self._exception = e
+                    raise
+        await super().flush_receive()
 
     async def add_partition(self, data: pd.DataFrame, partition_id: int) -> int:
         self.raise_if_closed()
         if self.transferred:
             raise RuntimeError(f"Cannot add more partitions to {self}")
 
-        def _() -> dict[str, tuple[int, bytes]]:
+        def _() -> dict[str, tuple[int, memoryview]]:
             out = split_by_worker(
                 data,
                 self.column,
-                self.worker_for,
+                self._worker_codes,
+                self._workers,
             )
-            out = {k: (partition_id, serialize_table(t)) for k, t in out.items()}
-            return out
+            buffers = serialize_tables(list(out.values()))
+            return {k: (partition_id, buffer) for k, buffer in zip(out, buffers)}
 
         out = await self.offload(_)
         await self._write_to_comm(out)
@@ -483,7 +692,10 @@ class DataFrameShuffleRun(ShuffleRun[int, "pd.DataFrame"]):
         return out
 
     def _get_assigned_worker(self, id: int) -> str:
-        return self.worker_for[id]
+        code = self._worker_codes[id] if 0 <= id < len(self._worker_codes) else -1
+        if code < 0:
+            raise KeyError(id)
+        return self._workers[code]
 
 
 @dataclass(eq=False)
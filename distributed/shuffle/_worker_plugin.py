@@ -2,20 +2,23 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import operator
 import os
+from collections.abc import Callable, Coroutine
 from concurrent.futures import ThreadPoolExecutor
-from typing import TYPE_CHECKING, Any, overload
+from typing import TYPE_CHECKING, Any, TypeVar, overload
 
 from dask.context import thread_state
 from dask.utils import parse_bytes
 
+from distributed.comm import CommClosedError
 from distributed.diagnostics.plugin import WorkerPlugin
 from distributed.shuffle._core import NDIndex, ShuffleId, ShuffleRun, ShuffleType
 from distributed.shuffle._exceptions import ShuffleClosedError
 from distributed.shuffle._limiter import ResourceLimiter
 from distributed.shuffle._rechunk import ArrayRechunkRun
 from distributed.shuffle._shuffle import DataFrameShuffleRun
-from distributed.utils import log_errors, sync
+from distributed.utils import in_async_call
 
 if TYPE_CHECKING:
     # TODO import from typing (requires Python >=3.10)
@@ -25,6 +28,10 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+_heartbeat = operator.methodcaller("heartbeat")
+
 
 class ShuffleWorkerPlugin(WorkerPlugin):
     """Interface between a Worker and a Shuffle.
@@ -41,7 +48,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
     worker: Worker
     shuffles: dict[ShuffleId, ShuffleRun]
     _runs: set[ShuffleRun]
-    _runs_cleanup_condition: asyncio.Condition
+    _runs_empty: asyncio.Event
     memory_limiter_comms: ResourceLimiter
     memory_limiter_disk: ResourceLimiter
     closed: bool
@@ -55,9 +62,11 @@ class ShuffleWorkerPlugin(WorkerPlugin):
 
         # Initialize
         self.worker = worker
+        self._directory_prefix = os.path.join(worker.local_directory, "shuffle-")
         self.shuffles = {}
         self._runs = set()
-        self._runs_cleanup_condition = asyncio.Condition()
+        self._runs_empty = asyncio.Event()
+        self._runs_empty.set()
         self.memory_limiter_comms = ResourceLimiter(parse_bytes("100 MiB"))
         self.memory_limiter_disk = ResourceLimiter(parse_bytes("1 GiB"))
         self.closed = False
@@ -74,16 +83,17 @@ class ShuffleWorkerPlugin(WorkerPlugin):
     # NOTE: handlers are not threadsafe, but they're called from async comms, so that's okay
 
     def heartbeat(self) -> dict:
-        return {id: shuffle.heartbeat() for id, shuffle in self.shuffles.items()}
+        return dict(zip(self.shuffles, map(_heartbeat, self.shuffles.values())))
 
     async def shuffle_receive(
         self,
         shuffle_id: ShuffleId,
         run_id: int,
-        data: list[tuple[int, bytes]],
+        data: Any,
     ) -> None:
         """
-        Handler: Receive an incoming shard of data from a peer worker.
+        Handler: Receive incoming shards of data from a peer worker.
+        The format of ``data`` is defined by the ``send`` method of the shuffle run.
         Using an unknown ``shuffle_id`` is an error.
         """
         shuffle = await self._get_shuffle_run(shuffle_id, run_id)
@@ -94,15 +104,24 @@ class ShuffleWorkerPlugin(WorkerPlugin):
         Handler: Inform the extension that all input partitions have been handed off to extensions.
         Using an unknown ``shuffle_id`` is an error.
         """
-        with log_errors():
+        try:
             shuffle = await self._get_shuffle_run(shuffle_id, run_id)
             await shuffle.inputs_done()
+        except CommClosedError:
+            raise
+        except Exception:
+            logger.exception("Failed to complete inputs of shuffle %s", shuffle_id)
+            raise
 
     async def _close_shuffle_run(self, shuffle: ShuffleRun) -> None:
-        await shuffle.close()
-        async with self._runs_cleanup_condition:
+        try:
+            await shuffle.close()
+        finally:
+            # Forget the run even if closing it failed, teardown waits for
+            # all runs to be removed
             self._runs.remove(shuffle)
-            self._runs_cleanup_condition.notify_all()
+            if not self._runs:
+                self._runs_empty.set()
 
     def shuffle_fail(self, shuffle_id: ShuffleId, run_id: int, message: str) -> None:
         """Fails the shuffle run with the message as exception and triggers cleanup.
@@ -132,14 +151,29 @@ class ShuffleWorkerPlugin(WorkerPlugin):
         type: ShuffleType,
         **kwargs: Any,
     ) -> int:
-        shuffle = self.get_or_create_shuffle(shuffle_id, type=type, **kwargs)
-        return sync(
-            self.worker.loop,
-            shuffle.add_partition,
-            data=data,
-            partition_id=partition_id,
+        key = thread_state.key
+        return self._run_on_loop(
+            self._add_partition,
+            data,
+            partition_id,
+            shuffle_id,
+            type,
+            key,
+            **kwargs,
         )
 
+    async def _add_partition(
+        self,
+        data: Any,
+        partition_id: int | tuple[int, ...],
+        shuffle_id: ShuffleId,
+        type: ShuffleType,
+        key: str,
+        **kwargs: Any,
+    ) -> int:
+        shuffle = await self._get_or_create_shuffle(shuffle_id, type, key, **kwargs)
+        return await shuffle.add_partition(data=data, partition_id=partition_id)
+
     async def _barrier(self, shuffle_id: ShuffleId, run_ids: list[int]) -> int:
         """
         Task: Note that the barrier task has been reached (`add_partition` called for all input partitions)
@@ -149,7 +183,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
         """
         run_id = run_ids[0]
         # Assert that all input data has been shuffled using the same run_id
-        assert all(run_id == id for id in run_ids)
+        assert run_ids.count(run_id) == len(run_ids)
         # Tell all peers that we've reached the barrier
         # Note that this will call `shuffle_inputs_done` on our own worker as well
         shuffle = await self._get_shuffle_run(shuffle_id, run_id)
@@ -264,7 +298,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
                 spec={
                     "npartitions": kwargs["npartitions"],
                     "column": kwargs["column"],
-                    "parts_out": kwargs["parts_out"],
+                    "parts_out": set(kwargs["parts_out"]),
                 },
                 worker=self.worker.address,
             )
@@ -294,20 +328,14 @@ class ShuffleWorkerPlugin(WorkerPlugin):
                 existing.fail(
                     RuntimeError("{existing!r} stale, expected run_id=={run_id}")
                 )
-
-                async def _(
-                    extension: ShuffleWorkerPlugin, shuffle: ShuffleRun
-                ) -> None:
-                    await shuffle.close()
-                    async with extension._runs_cleanup_condition:
-                        extension._runs.remove(shuffle)
-                        extension._runs_cleanup_condition.notify_all()
-
-                self.worker._ongoing_background_tasks.call_soon(_, self, existing)
+                self.worker._ongoing_background_tasks.call_soon(
+                    self._close_shuffle_run, existing
+                )
 
         shuffle = self._create_shuffle_run(shuffle_id, result)
         self.shuffles[shuffle_id] = shuffle
         self._runs.add(shuffle)
+        self._runs_empty.clear()
         return shuffle
 
     def _create_shuffle_run(
@@ -331,11 +359,9 @@ class ShuffleWorkerPlugin(WorkerPlugin):
             output_workers=result["output_workers"],
             id=shuffle_id,
             run_id=result["run_id"],
-            directory=os.path.join(
-                self.worker.local_directory,
-                f"shuffle-{shuffle_id}-{result['run_id']}",
-            ),
+            directory=f"{self._directory_prefix}{shuffle_id}-{result['run_id']}",
             executor=self._executor,
+            nthreads=self.worker.state.nthreads,
             local_address=self.worker.address,
             rpc=self.worker.rpc,
             scheduler=self.worker.scheduler,
@@ -353,10 +379,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
             new=result["new"],
             id=shuffle_id,
             run_id=result["run_id"],
-            directory=os.path.join(
-                self.worker.local_directory,
-                f"shuffle-{shuffle_id}-{result['run_id']}",
-            ),
+            directory=f"{self._directory_prefix}{shuffle_id}-{result['run_id']}",
             executor=self._executor,
             local_address=self.worker.address,
             rpc=self.worker.rpc,
@@ -370,14 +393,17 @@ class ShuffleWorkerPlugin(WorkerPlugin):
 
         self.closed = True
 
-        while self.shuffles:
-            _, shuffle = self.shuffles.popitem()
-            self.worker._ongoing_background_tasks.call_soon(
-                self._close_shuffle_run, shuffle
-            )
-
-        async with self._runs_cleanup_condition:
-            await self._runs_cleanup_condition.wait_for(lambda: not self._runs)
+        shuffles = list(self.shuffles.values())
+        self.shuffles.clear()
+        results = await asyncio.gather(
+            *(self._close_shuffle_run(shuffle) for shuffle in shuffles),
+            return_exceptions=True,
+        )
+        for shuffle, result in zip(shuffles, results):
+            if isinstance(result, BaseException):
+                logger.error("Failed to close %s", shuffle, exc_info=result)
+        # Runs that failed earlier may still be closing in the background
+        await self._runs_empty.wait()
 
         try:
             self._executor.shutdown(cancel_futures=True)
@@ -388,8 +414,28 @@ class ShuffleWorkerPlugin(WorkerPlugin):
     # Methods for worker thread #
     #############################
 
+    def _run_on_loop(
+        self,
+        func: Callable[..., Coroutine[Any, Any, _T]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> _T:
+        """Run ``func`` on the worker's event loop and block until it returns"""
+        loop = self.worker.loop.asyncio_loop  # type: ignore[attr-defined]
+        if loop.is_closed():
+            raise RuntimeError("IOLoop is closed")
+        if in_async_call(self.worker.loop):
+            # Blocking on the result would deadlock the loop
+            raise RuntimeError(f"{func} called from thread of running loop")
+        future = asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop)
+        try:
+            return future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+
     def barrier(self, shuffle_id: ShuffleId, run_ids: list[int]) -> int:
-        result = sync(self.worker.loop, self._barrier, shuffle_id, run_ids)
+        result = self._run_on_loop(self._barrier, shuffle_id, run_ids)
         return result
 
     def get_shuffle_run(
@@ -397,8 +443,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
         shuffle_id: ShuffleId,
         run_id: int,
     ) -> ShuffleRun:
-        return sync(
-            self.worker.loop,
+        return self._run_on_loop(
             self._get_shuffle_run,
             shuffle_id,
             run_id,
@@ -411,8 +456,7 @@ class ShuffleWorkerPlugin(WorkerPlugin):
         **kwargs: Any,
     ) -> ShuffleRun:
         key = thread_state.key
-        return sync(
-            self.worker.loop,
+        return self._run_on_loop(
             self._get_or_create_shuffle,
             shuffle_id,
             type,
@@ -432,12 +476,25 @@ class ShuffleWorkerPlugin(WorkerPlugin):
 
         Calling this for a ``shuffle_id`` which is unknown or incomplete is an error.
         """
-        shuffle = self.get_shuffle_run(shuffle_id, run_id)
         key = thread_state.key
-        return sync(
-            self.worker.loop,
-            shuffle.get_output_partition,
-            partition_id=partition_id,
-            key=key,
-            meta=meta,
+        return self._run_on_loop(
+            self._get_output_partition,
+            shuffle_id,
+            run_id,
+            partition_id,
+            key,
+            meta,
+        )
+
+    async def _get_output_partition(
+        self,
+        shuffle_id: ShuffleId,
+        run_id: int,
+        partition_id: int | NDIndex,
+        key: str,
+        meta: pd.DataFrame | None,
+    ) -> Any:
+        shuffle = await self._get_shuffle_run(shuffle_id, run_id)
+        return await shuffle.get_output_partition(
+            partition_id=partition_id, key=key, meta=meta
         )
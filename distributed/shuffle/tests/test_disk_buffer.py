@@ -48,6 +48,17 @@ async def test_read_before_flush(tmp_path):
             mf.read(2)
 
 
+@gen_test()
+async def test_write_frames(tmp_path):
+    async with DiskShardsBuffer(directory=tmp_path) as mf:
+        await mf.write({"x": [b"0" * 10, memoryview(b"1" * 5)], "y": b"2"})
+        await mf.write({"x": [bytearray(b"3")]})
+        await mf.flush()
+
+        assert mf.read("x") == b"0" * 10 + b"1" * 5 + b"3"
+        assert mf.read("y") == b"2"
+
+
 @pytest.mark.parametrize("count", [2, 100, 1000])
 @gen_test()
 async def test_many(tmp_path, count):
@@ -123,3 +134,33 @@ async def test_high_pressure_flush_with_exception(tmp_path):
         with pytest.raises(Exception, match="123"):
             await mf.flush()
             mf.raise_on_exception()
+
+
+@gen_test()
+async def test_write_more_frames_than_iov_max(tmp_path):
+    from distributed.shuffle._disk import _IOV_MAX
+
+    frames = [str(i % 10).encode() * (i % 3) for i in range(2 * _IOV_MAX + 10)]
+    async with DiskShardsBuffer(directory=tmp_path) as mf:
+        await mf.write({"x": frames})
+        await mf.flush()
+
+        assert mf.read("x") == b"".join(frames)
+
+
+@pytest.mark.skipif(not hasattr(os, "writev"), reason="requires os.writev")
+def test_writev_partial_writes(tmp_path, monkeypatch):
+    from distributed.shuffle import _disk
+
+    writev = os.writev
+    # Write at most 3 bytes of the first frame per call
+    monkeypatch.setattr(os, "writev", lambda fd, buffers: writev(fd, [buffers[0][:3]]))
+
+    frames = [memoryview(b"abcde"), memoryview(b"f"), memoryview(b"ghijklmnop")]
+    path = tmp_path / "x"
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+    try:
+        _disk._writev(fd, frames)
+    finally:
+        os.close(fd)
+    assert path.read_bytes() == b"abcdefghijklmnop"
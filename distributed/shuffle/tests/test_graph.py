@@ -110,3 +110,23 @@ def test_multiple_linear(client):
         df.assign(x=lambda df: df.x + 1).shuffle("x", shuffle="tasks"),
         scheduler=client,
     )
+
+
+def test_cull_shares_input_keys():
+    df = dd.from_pandas(pd.DataFrame({"x": range(20)}), npartitions=5)
+    shuffled = df.shuffle("x", shuffle="p2p", npartitions=4)
+    layer = shuffled.dask.layers[
+        next(name for name in shuffled.dask.layers if name.startswith("shuffle-p2p"))
+    ]
+    culled, deps = layer.cull({(layer.name, 0), (layer.name, 2)}, None)
+    assert culled.parts_out == {0, 2}
+    assert set(deps) == {(layer.name, 0), (layer.name, 2)}
+    expected = {(layer.name_input, i) for i in range(5)}
+    assert all(d == expected for d in deps.values())
+    assert deps[(layer.name, 0)] is deps[(layer.name, 2)]
+
+    culled_again, deps_again = culled.cull({(layer.name, 2)}, None)
+    assert culled_again.parts_out == {2}
+    assert deps_again[(layer.name, 2)] is layer.input_keys
+    # 5 transfer tasks, 1 barrier and 1 unpack task
+    assert len(culled_again) == 7
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import asyncio
 import math
+import os
 import random
+import subprocess
+import sys
 import warnings
 
 import pytest
@@ -17,11 +20,16 @@ from dask.array.core import concatenate3
 from dask.array.rechunk import normalize_chunks, rechunk
 from dask.array.utils import assert_eq
 
+from distributed.protocol import pickle
 from distributed.shuffle._core import ShuffleId
 from distributed.shuffle._limiter import ResourceLimiter
 from distributed.shuffle._rechunk import (
     ArrayRechunkRun,
     Split,
+    _make_contiguous,
+    _ShardFrames,
+    _ShardPickler,
+    convert_chunk,
     get_worker_for_hash_sharding,
     split_axes,
 )
@@ -199,6 +207,38 @@ async def test_rechunk_2d(c, s, *ws):
     assert np.all(await c.compute(x2) == a)
 
 
+@gen_cluster(client=True, config={"distributed.p2p.compression": "zlib"})
+async def test_rechunk_compressed(c, s, *ws):
+    a = np.zeros((100, 300))
+    a[::7] = np.random.default_rng().uniform(0, 1, 300)
+    x = da.from_array(a, chunks=((10, 20, 30, 40), (50,) * 6))
+    new = ((50, 50), (150,) * 2)
+    x2 = rechunk(x, chunks=new, method="p2p")
+    assert x2.chunks == new
+    assert np.all(await c.compute(x2) == a)
+
+
+@pytest.mark.parametrize(
+    "new",
+    [
+        # Single shards, shards along one axis and a grid of shards
+        ((1, 2, 3, 4), (5, 5, 10, 10)),
+        ((5, 5), (30,)),
+        ((5, 5), (15, 15)),
+    ],
+)
+@gen_cluster(client=True)
+async def test_rechunk_masked_array(c, s, *ws, new):
+    a = np.ma.masked_greater(np.arange(300.0).reshape((10, 30)) % 7, 4)
+    x = da.from_array(a, chunks=((1, 2, 3, 4), (5,) * 6), asarray=False)
+    x2 = rechunk(x, chunks=new, method="p2p")
+    assert x2.chunks == new
+    result = await c.compute(x2)
+    assert isinstance(result, np.ma.MaskedArray)
+    np.testing.assert_array_equal(result.mask, a.mask)
+    np.testing.assert_array_equal(result, a)
+
+
 @gen_cluster(client=True)
 async def test_rechunk_4d(c, s, *ws):
     """Try rechunking a random 4d matrix
@@ -1130,3 +1170,113 @@ def test_split_axes_with_zero():
         [[Split(0, 0, slice(0, 1, None)), Split(1, 0, slice(1, 2, None))]],
     ]
     assert result == expected
+
+
+def test_split_axes_is_cached():
+    old = ((10, 10, 10, 10, 10),)
+    new = ((25, 5, 20),)
+    assert split_axes(old, new) is split_axes(old, new)
+
+
+@pytest.mark.parametrize(
+    "subshape", [(1, 1), (3, 1), (1, 3), (2, 3), (2, 1, 3), (2, 2, 2)]
+)
+def test_convert_chunk(subshape):
+    rng = np.random.default_rng()
+    shards = np.empty(subshape, dtype="O")
+    frames = []
+    pickler = _ShardPickler()
+    for index in np.ndindex(subshape):
+        shards[index] = rng.random(tuple(i + 2 for i in index))
+        frames.extend(pickler.dump(index, shards[index]))
+
+    result = convert_chunk(b"".join(frames))
+    assert result.flags.writeable
+    np.testing.assert_array_equal(result, concatenate3(shards.tolist()), strict=True)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_convert_chunk_compressed(compression):
+    shards = np.empty((2, 1), dtype="O")
+    shards[0, 0] = np.zeros((100, 100))
+    shards[1, 0] = np.random.default_rng().random((100, 100))
+    frames = []
+    pickler = _ShardPickler(compression)
+    for index in np.ndindex(shards.shape):
+        frames.extend(pickler.dump(index, shards[index]))
+    compressed = sum(memoryview(frame).nbytes for frame in frames) < 2 * 80_000
+    assert compressed == bool(compression)
+
+    result = convert_chunk(b"".join(frames))
+    np.testing.assert_array_equal(result, concatenate3(shards.tolist()), strict=True)
+
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_incompressible_shards_are_sent_out_of_band(compression):
+    shard = np.random.default_rng().random((100, 100))
+    frames = _ShardPickler(compression).dump((0, 0), shard)
+    buffers = []
+    pickle.dumps(
+        _ShardFrames.from_shards([((0, 0), frames)]), buffer_callback=buffers.append
+    )
+    assert len(buffers) == 1
+    assert memoryview(buffers[0]).nbytes == shard.nbytes
+
+
+def test_convert_chunk_single_shard_is_zero_copy():
+    shard = np.arange(12.0).reshape(3, 4)
+    data = bytearray(b"".join(_ShardPickler().dump((0, 0), shard)))
+    result = convert_chunk(data)
+    np.testing.assert_array_equal(result, shard, strict=True)
+    assert result.flags.writeable
+    assert result.flags.aligned
+    buffer = np.frombuffer(data, dtype="u1")
+    assert np.shares_memory(result, buffer)
+    assert (result.ctypes.data - buffer.ctypes.data) % 64 == 0
+
+
+def test_convert_chunk_copies_unaligned_shard():
+    shard = np.arange(12.0).reshape(3, 4)
+    frames = _ShardPickler().dump((0, 0), shard)
+    data = bytearray(1 + sum(memoryview(frame).nbytes for frame in frames))
+    data[1:] = b"".join(frames)
+    result = convert_chunk(memoryview(data)[1:])
+    np.testing.assert_array_equal(result, shard, strict=True)
+    assert result.flags.writeable
+    assert result.flags.aligned
+
+
+def test_hash_sharding_is_independent_of_hashseed():
+    code = (
+        "from distributed.shuffle._rechunk import get_worker_for_hash_sharding;"
+        "print([get_worker_for_hash_sharding((i, 3, 7), 'abcde') for i in range(20)])"
+    )
+    results = {
+        subprocess.check_output(
+            [sys.executable, "-c", code], env={**os.environ, "PYTHONHASHSEED": seed}
+        )
+        for seed in ["0", "1", "random"]
+    }
+    assert len(results) == 1
+
+
+def test_make_contiguous():
+    x = np.arange(60).reshape(6, 10)
+    shards = [x[:3, :5], x[3:, :], x[:, 5:7], np.array([[1, None]], dtype=object)]
+    result = _make_contiguous(shards)
+    assert len(result) == len(shards)
+    for shard, contiguous in zip(shards, result):
+        np.testing.assert_array_equal(shard, contiguous, strict=True)
+        assert contiguous.flags.forc
+    # Already contiguous shards and arrays of objects are not copied
+    assert result[1] is shards[1]
+    assert result[3] is shards[3]
+    # Non-contiguous shards share a single buffer
+    assert result[0].base is result[2].base
+
+
+def test_make_contiguous_ignores_other_array_types():
+    x = np.ma.masked_greater(np.arange(60).reshape(6, 10), 30)
+    shards = [x[:3, :5], x[:, 5:7], [[1, 2], [3, 4]]]
+    result = _make_contiguous(shards)
+    assert all(a is b for a, b in zip(result, shards))
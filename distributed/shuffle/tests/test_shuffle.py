@@ -30,13 +30,17 @@ from distributed.scheduler import KilledWorker, Scheduler
 from distributed.scheduler import TaskState as SchedulerTaskState
 from distributed.shuffle._arrow import (
     convert_partition,
+    deserialize_table,
     list_of_buffers_to_table,
     serialize_table,
+    serialize_tables,
 )
+from distributed.shuffle._exceptions import ShuffleClosedError
 from distributed.shuffle._limiter import ResourceLimiter
 from distributed.shuffle._scheduler_plugin import ShuffleSchedulerPlugin
 from distributed.shuffle._shuffle import (
     DataFrameShuffleRun,
+    encode_worker_for,
     get_worker_for_range_sharding,
     split_by_partition,
     split_by_worker,
@@ -49,6 +53,7 @@ from distributed.shuffle.tests.utils import (
 from distributed.utils import Deadline
 from distributed.utils_test import (
     async_poll_for,
+    captured_logger,
     cluster,
     gen_cluster,
     gen_test,
@@ -152,6 +157,25 @@ async def test_basic_integration(c, s, a, b, lose_annotations, npartitions):
     await check_scheduler_cleanup(s)
 
 
+@pytest.mark.parametrize("batch_size", ["0 B", "1 KiB", "1 GiB"])
+@gen_cluster(client=True)
+async def test_batch_size(c, s, a, b, batch_size):
+    df = dask.datasets.timeseries(
+        start="2000-01-01",
+        end="2000-01-10",
+        dtypes={"x": float, "y": float},
+        freq="10 s",
+    )
+    with dask.config.set({"distributed.p2p.batch-size": batch_size}):
+        out = dd.shuffle.shuffle(df, "x", shuffle="p2p")
+        result, expected = await c.gather(c.compute([out, df]))
+    dd.assert_eq(result, expected, check_index=False)
+
+    await check_worker_cleanup(a)
+    await check_worker_cleanup(b)
+    await check_scheduler_cleanup(s)
+
+
 @pytest.mark.parametrize("npartitions", [None, 1, 20])
 @gen_cluster(client=True)
 async def test_shuffle_with_array_conversion(c, s, a, b, lose_annotations, npartitions):
@@ -213,26 +237,41 @@ async def test_concurrent(c, s, a, b, lose_annotations):
     await check_scheduler_cleanup(s)
 
 
+@pytest.mark.parametrize(
+    "batch_size, failing_task",
+    [
+        # Every shard is written immediately, so the disk fails during the transfer
+        (0, "shuffle_transfer"),
+        # With the default batch size, the small shards of this shuffle are held
+        # back until the first output partition is read
+        (None, "shuffle_unpack"),
+    ],
+)
 @gen_cluster(client=True)
-async def test_bad_disk(c, s, a, b):
+async def test_bad_disk(c, s, a, b, batch_size, failing_task):
+    if batch_size is None:
+        batch_size = dask.config.get("distributed.p2p.batch-size")
     df = dask.datasets.timeseries(
         start="2000-01-01",
         end="2000-01-10",
         dtypes={"x": float, "y": float},
         freq="10 s",
     )
-    out = dd.shuffle.shuffle(df, "x", shuffle="p2p")
-    out = out.persist()
-    shuffle_id = await wait_until_new_shuffle_is_initialized(s)
-    while not a.plugins["shuffle"].shuffles:
-        await asyncio.sleep(0.01)
-    shutil.rmtree(a.local_directory)
-
-    while not b.plugins["shuffle"].shuffles:
-        await asyncio.sleep(0.01)
-    shutil.rmtree(b.local_directory)
-    with pytest.raises(RuntimeError, match=f"shuffle_transfer failed .* {shuffle_id}"):
-        out = await c.compute(out)
+    with dask.config.set({"distributed.p2p.batch-size": batch_size}):
+        out = dd.shuffle.shuffle(df, "x", shuffle="p2p")
+        out = out.persist()
+        shuffle_id = await wait_until_new_shuffle_is_initialized(s)
+        while not a.plugins["shuffle"].shuffles:
+            await asyncio.sleep(0.01)
+        shutil.rmtree(a.local_directory)
+
+        while not b.plugins["shuffle"].shuffles:
+            await asyncio.sleep(0.01)
+        shutil.rmtree(b.local_directory)
+        with pytest.raises(
+            RuntimeError, match=f"{failing_task} failed .* {shuffle_id}"
+        ):
+            out = await c.compute(out)
 
     await c.close()
     await check_worker_cleanup(a)
@@ -623,6 +662,38 @@ async def test_closed_worker_during_barrier(c, s, a, b):
     await check_scheduler_cleanup(s)
 
 
+class ErrorCloseShuffle(BlockedInputsDoneShuffle):
+    async def close(self) -> None:
+        await super().close()
+        raise RuntimeError("Error during close")
+
+
+@mock.patch(
+    "distributed.shuffle._worker_plugin.DataFrameShuffleRun",
+    ErrorCloseShuffle,
+)
+@gen_cluster(client=True, nthreads=[("", 1)])
+async def test_teardown_logs_failure_to_close(c, s, a):
+    df = dask.datasets.timeseries(
+        start="2000-01-01",
+        end="2000-01-10",
+        dtypes={"x": float, "y": float},
+        freq="10 s",
+    )
+    out = dd.shuffle.shuffle(df, "x", shuffle="p2p")
+    out = c.compute(out.x.size)
+    shuffle_id = await wait_until_new_shuffle_is_initialized(s)
+    await wait_for_state(barrier_key(shuffle_id), "processing", s)
+    shuffle = get_shuffle_run_from_worker(shuffle_id, a)
+    await shuffle.in_inputs_done.wait()
+
+    with captured_logger("distributed.shuffle._worker_plugin") as logger:
+        await a.close()
+    assert "Failed to close" in logger.getvalue()
+    assert "Error during close" in logger.getvalue()
+    await check_worker_cleanup(a, closed=True)
+
+
 @mock.patch(
     "distributed.shuffle._worker_plugin.DataFrameShuffleRun",
     BlockedInputsDoneShuffle,
@@ -996,7 +1067,7 @@ def test_processing_chain():
     worker_for = {i: random.choice(workers) for i in list(range(npartitions))}
     worker_for = pd.Series(worker_for, name="_worker").astype("category")
 
-    data = split_by_worker(df, "_partitions", worker_for=worker_for)
+    data = split_by_worker(df, "_partitions", *encode_worker_for(worker_for))
     assert set(data) == set(worker_for.cat.categories)
     assert sum(map(len, data.values())) == len(df)
 
@@ -1075,6 +1146,18 @@ async def test_head(c, s, a, b):
     await check_scheduler_cleanup(s)
 
 
+def test_serialize_tables():
+    pa = pytest.importorskip("pyarrow")
+
+    tables = [
+        pa.table({"x": range(i), "y": [str(j) for j in range(i)]}) for i in range(4)
+    ]
+    buffers = serialize_tables(tables)
+    assert [bytes(buffer) for buffer in buffers] == list(map(serialize_table, tables))
+    for buffer, table in zip(buffers, tables):
+        assert deserialize_table(buffer).equals(table)
+
+
 def test_split_by_worker():
     workers = ["a", "b", "c"]
     npartitions = 5
@@ -1463,6 +1546,7 @@ class DataFrameShuffleTestPool(AbstractShuffleTestPool):
             run_id=next(AbstractShuffleTestPool._shuffle_run_id_iterator),
             local_address=name,
             executor=self._executor,
+            nthreads=2,
             rpc=self,
             scheduler=self,
             memory_limiter_disk=ResourceLimiter(10000000),
@@ -1607,6 +1691,136 @@ async def test_error_offload(tmp_path, loop_in_thread):
             await asyncio.gather(*[s.close() for s in [sA, sB]])
 
 
+@gen_test()
+async def test_offload_to_disk_cancels_remaining_parts(tmp_path, loop_in_thread):
+    pytest.importorskip("pyarrow")
+    cancelled = []
+
+    class PartiallyFailingOffload(DataFrameShuffleRun):
+        async def offload(self, func, part):
+            if part == 0:
+                raise RuntimeError("Error in first part")
+            try:
+                await asyncio.sleep(10)
+            finally:
+                cancelled.append(part)
+
+    with DataFrameShuffleTestPool() as local_shuffle_pool:
+        s = local_shuffle_pool.new_shuffle(
+            name="A",
+            worker_for_mapping={0: "A"},
+            directory=tmp_path,
+            loop=loop_in_thread,
+            Shuffle=PartiallyFailingOffload,
+        )
+        try:
+            with pytest.raises(RuntimeError, match="Error in first part"):
+                await s._offload_to_disk(lambda part: {}, [0, 1, 2])
+            assert sorted(cancelled) == [1, 2]
+        finally:
+            await s.close()
+
+
+@gen_test()
+async def test_coalesce_merges_small_shards(tmp_path, loop_in_thread):
+    pa = pytest.importorskip("pyarrow")
+    shard = pa.table({"x": range(16)})
+    assert shard.nbytes == 128
+
+    with dask.config.set({"distributed.p2p.batch-size": "1 KiB"}):
+        with DataFrameShuffleTestPool() as local_shuffle_pool:
+            s = local_shuffle_pool.new_shuffle(
+                name="A",
+                worker_for_mapping={0: "A", 1: "A"},
+                directory=tmp_path,
+                loop=loop_in_thread,
+            )
+            try:
+                for _ in range(7):
+                    assert s._coalesce({0: shard}, shard.nbytes) == {}
+                ready = s._coalesce({0: shard}, shard.nbytes)
+                assert list(ready) == [0]
+                assert len(ready[0]) == 8
+                assert not s._held
+
+                buffers = s._serialize_groups(ready)
+                assert list(buffers) == [(0,)]
+                table = deserialize_table(buffers[(0,)])
+                assert table.equals(pa.concat_tables([shard] * 8))
+            finally:
+                await s.close()
+
+
+@gen_test()
+async def test_coalesce_passes_shards_through_without_batch_size(
+    tmp_path, loop_in_thread
+):
+    pa = pytest.importorskip("pyarrow")
+    shards = {0: pa.table({"x": [1, 2]}), 1: pa.table({"x": [3]})}
+
+    with dask.config.set({"distributed.p2p.batch-size": 0}):
+        with DataFrameShuffleTestPool() as local_shuffle_pool:
+            s = local_shuffle_pool.new_shuffle(
+                name="A",
+                worker_for_mapping={0: "A", 1: "A"},
+                directory=tmp_path,
+                loop=loop_in_thread,
+            )
+            try:
+                for _ in range(3):
+                    ready = s._coalesce(shards, 24)
+                    assert ready == {k: [v] for k, v in shards.items()}
+                    assert not s._held
+                    assert s._held_batches == 0
+                    assert s._held_memory == 0
+
+                buffers = s._serialize_groups(ready)
+                assert list(buffers) == [(0,), (1,)]
+                for (k,), buffer in buffers.items():
+                    assert deserialize_table(buffer).equals(shards[k])
+            finally:
+                await s.close()
+
+
+@pytest.mark.parametrize("max_buffered_batches", [1, 3])
+@gen_test()
+async def test_coalesce_releases_after_max_buffered_batches(
+    tmp_path, loop_in_thread, max_buffered_batches
+):
+    pa = pytest.importorskip("pyarrow")
+    shards = {0: pa.table({"x": [1, 2]}), 1: pa.table({"x": [3]})}
+
+    with dask.config.set(
+        {
+            "distributed.p2p.batch-size": "1 GiB",
+            "distributed.p2p.max-buffered-batches": max_buffered_batches,
+        }
+    ):
+        with DataFrameShuffleTestPool() as local_shuffle_pool:
+            s = local_shuffle_pool.new_shuffle(
+                name="A",
+                worker_for_mapping={0: "A", 1: "A"},
+                directory=tmp_path,
+                loop=loop_in_thread,
+            )
+            try:
+                for i in range(max_buffered_batches):
+                    assert s._coalesce(shards, 24) == {}
+                    assert s._held_batches == i + 1
+                    assert s._held_memory == 24 * (i + 1)
+
+                ready = s._coalesce(shards, 24)
+                assert ready == {
+                    k: [v] * (max_buffered_batches + 1) for k, v in shards.items()
+                }
+                assert not s._held
+                assert not s._held_nbytes
+                assert s._held_batches == 0
+                assert s._held_memory == 0
+            finally:
+                await s.close()
+
+
 @gen_test()
 async def test_error_send(tmp_path, loop_in_thread):
     pa = pytest.importorskip("pyarrow")
@@ -1682,7 +1896,7 @@ async def test_error_receive(tmp_path, loop_in_thread):
         partitions_for_worker[w].append(part)
 
     class ErrorReceive(DataFrameShuffleRun):
-        async def receive(self, data: list[tuple[int, bytes]]) -> None:
+        async def receive(self, data: tuple[list[int], list[int], Any]) -> None:
             raise RuntimeError("Error during receive")
 
     with DataFrameShuffleTestPool() as local_shuffle_pool:
@@ -1816,6 +2030,24 @@ async def test_handle_stale_barrier(c, s, a, b, wait_until_forgotten):
     await check_scheduler_cleanup(s)
 
 
+@gen_cluster(nthreads=[("", 1)])
+async def test_worker_methods_raise_on_loop_thread(s, a):
+    worker_plugin = a.plugins["shuffle"]
+    with pytest.raises(RuntimeError, match="running loop"):
+        worker_plugin.barrier(ShuffleId("shuffle"), [1])
+
+
+def test_worker_methods_fail_on_closed_loop():
+    loop = asyncio.new_event_loop()
+    loop.close()
+    worker_plugin = ShuffleWorkerPlugin()
+    worker_plugin.worker = mock.Mock(**{"loop.asyncio_loop": loop})
+    # A ShuffleClosedError would reschedule the task instead of failing it
+    with pytest.raises(RuntimeError, match="IOLoop is closed") as e:
+        worker_plugin.barrier(ShuffleId("shuffle"), [1])
+    assert not isinstance(e.value, ShuffleClosedError)
+
+
 @gen_cluster(client=True, nthreads=[("", 1)])
 async def test_shuffle_run_consistency(c, s, a):
     """This test checks the correct creation of shuffle run IDs through the scheduler
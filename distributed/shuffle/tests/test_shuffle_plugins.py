@@ -5,6 +5,7 @@ from asyncio import iscoroutinefunction
 import pytest
 
 from distributed.shuffle._shuffle import (
+    encode_worker_for,
     get_worker_for_range_sharding,
     split_by_partition,
     split_by_worker,
@@ -56,7 +57,7 @@ def test_split_by_worker():
             npartitions, part, workers
         )
     worker_for = pd.Series(worker_for_mapping, name="_workers").astype("category")
-    out = split_by_worker(df, "_partition", worker_for)
+    out = split_by_worker(df, "_partition", *encode_worker_for(worker_for))
     assert set(out) == {"alice", "bob"}
     assert list(out["alice"].to_pandas().columns) == list(df.columns)
 
@@ -73,7 +74,7 @@ def test_split_by_worker_empty():
         }
     )
     worker_for = pd.Series({5: "chuck"}, name="_workers").astype("category")
-    out = split_by_worker(df, "_partition", worker_for)
+    out = split_by_worker(df, "_partition", *encode_worker_for(worker_for))
     assert out == {}
 
 
@@ -94,7 +95,7 @@ def test_split_by_worker_many_workers():
             npartitions, part, workers
         )
     worker_for = pd.Series(worker_for_mapping, name="_workers").astype("category")
-    out = split_by_worker(df, "_partition", worker_for)
+    out = split_by_worker(df, "_partition", *encode_worker_for(worker_for))
     assert get_worker_for_range_sharding(npartitions, 5, workers) in out
     assert get_worker_for_range_sharding(npartitions, 0, workers) in out
     assert get_worker_for_range_sharding(npartitions, 7, workers) in out
@@ -118,3 +119,17 @@ def test_split_by_partition():
     assert set(out) == {1, 2, 3}
     assert out[1].column_names == list(df.columns)
     assert sum(map(len, out.values())) == len(df)
+
+
+def test_split_by_partition_combines_chunks():
+    pa = pytest.importorskip("pyarrow")
+
+    df = pd.DataFrame({"x": range(10), "_partition": [3, 1, 2, 3, 1] * 2})
+    t = pa.concat_tables([pa.Table.from_pandas(df[:5]), pa.Table.from_pandas(df[5:])])
+    assert t.column("x").num_chunks == 2
+
+    out = split_by_partition(t, "_partition")
+    assert set(out) == {1, 2, 3}
+    for shard in out.values():
+        assert all(column.num_chunks == 1 for column in shard.columns)
+    assert sum(map(len, out.values())) == len(df)